@@ -2,8 +2,21 @@
 import streamlit as st
 from google.cloud import bigquery
 from google.oauth2 import service_account
+try:
+    from google.cloud import bigquery_storage
+except ImportError:
+    # Optional fast transport - downloads fall back to REST paging without it
+    bigquery_storage = None
+try:
+    import ahocorasick
+except ImportError:
+    # Optional - multi-term highlighting falls back to the regex alternation
+    ahocorasick = None
 import pandas as pd
+from collections import namedtuple
 from datetime import datetime, timedelta
+import hashlib
+import hmac
 import re
 import os
 from dotenv import load_dotenv
@@ -19,13 +32,39 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+Config = namedtuple("Config", ["project", "dataset", "table", "summary", "password_sha256"])
+
+# Application configuration, resolved from Streamlit secrets (with
+# environment-variable fallback) once per process instead of walking the
+# secrets parser on every interaction
+@st.cache_resource
+def get_config():
+    return Config(
+        project=st.secrets.get("PROJECT_ID", os.getenv("PROJECT_ID")),
+        dataset=st.secrets.get("DATASET", os.getenv("DATASET")),
+        table=st.secrets.get("TABLE", os.getenv("TABLE")),
+        summary=st.secrets.get("SUMMARY", os.getenv("SUMMARY")),
+        # Prefer a pre-hashed secret; hash a legacy plaintext APP_PASSWORD
+        # once here so the comparison below never sees the plaintext
+        password_sha256=st.secrets.get(
+            "APP_PASSWORD_SHA256",
+            os.getenv(
+                "APP_PASSWORD_SHA256",
+                hashlib.sha256(
+                    st.secrets.get("APP_PASSWORD", os.getenv("APP_PASSWORD", "password123")).encode()
+                ).hexdigest(),
+            ),
+        ),
+    )
+
 # Password protection
 def check_password():
     """Returns `True` if the user has entered the correct password."""
     
     def password_entered():
         """Checks whether a password entered by the user is correct."""
-        if st.session_state["password"] == st.secrets.get("APP_PASSWORD", os.getenv("APP_PASSWORD", "password123")):
+        candidate = hashlib.sha256(st.session_state["password"].encode()).hexdigest()
+        if hmac.compare_digest(candidate, get_config().password_sha256):
             st.session_state["password_correct"] = True
             del st.session_state["password"]  # Don't store password
         else:
@@ -53,26 +92,52 @@ def check_password():
 if not check_password():
     st.stop()  # Don't continue if password is not correct
 
-# Initialize BigQuery client (cached to avoid recreating)
+# Service-account credentials, built once per process and shared by both
+# clients - constructing them is the longest blocking step on cold start
 @st.cache_resource
-def get_bigquery_client():
+def get_credentials():
     # Try to use Streamlit secrets first (for deployment), fallback to local auth
     try:
-        credentials = service_account.Credentials.from_service_account_info(
+        return service_account.Credentials.from_service_account_info(
             st.secrets["gcp_service_account"]
         )
-        return bigquery.Client(credentials=credentials)
     except (KeyError, FileNotFoundError):
-        # Local development - use default credentials
-        return bigquery.Client()
+        # Local development - None makes the clients use default credentials
+        return None
+
+# Initialize BigQuery client (cached to avoid recreating)
+@st.cache_resource
+def get_bigquery_client():
+    return bigquery.Client(credentials=get_credentials())
+
+# BigQuery Storage read client (cached) - streams results as columnar Arrow
+# batches instead of paginated REST/JSON rows
+@st.cache_resource
+def get_bqstorage_client():
+    if bigquery_storage is None:
+        return None
+    return bigquery_storage.BigQueryReadClient(credentials=get_credentials())
 
 client = get_bigquery_client()
+bqstorage_client = get_bqstorage_client()
+
+# Configuration - resolved once and reused everywhere
+cfg = get_config()
 
-# Configuration - try Streamlit secrets first, fallback to environment variables
-PROJECT_ID = st.secrets.get("PROJECT_ID", os.getenv("PROJECT_ID"))
-DATASET = st.secrets.get("DATASET", os.getenv("DATASET"))
-TABLE = st.secrets.get("TABLE", os.getenv("TABLE"))
-SUMMARY = st.secrets.get("SUMMARY", os.getenv("SUMMARY"))
+# Sidebar metadata lookups, cached for an hour: the category list and the
+# summary table's existence are dataset-constant, so they shouldn't cost a
+# BigQuery job per rerun
+@st.cache_data(ttl=3600)
+def load_categories(project, dataset, summary):
+    categories_query = f"SELECT DISTINCT category FROM `{project}.{dataset}.{summary}` WHERE category IS NOT NULL ORDER BY category"
+    return client.query(categories_query).to_dataframe()['category'].tolist()
+
+@st.cache_data(ttl=3600)
+def check_summary_table(project, dataset, summary):
+    # get_table is a free metadata RPC (raises NotFound if missing), unlike
+    # the old COUNT(*) probe which ran a billed query job
+    client.get_table(f"{project}.{dataset}.{summary}")
+    return True
 
 # Custom CSS for better styling
 st.markdown("""
@@ -96,7 +161,7 @@ st.markdown("""
 
 # Main title
 st.title("Email Search Tool")
-st.markdown(f"Target dataset: `{DATASET}.{TABLE}`")
+st.markdown(f"Target dataset: `{cfg.dataset}.{cfg.table}`")
 
 # Sidebar for filters
 with st.sidebar:
@@ -114,16 +179,14 @@ with st.sidebar:
     # Category filter - fetch categories if summary table exists
     category_filter = None
     summary_table_available = False
-    if SUMMARY:
+    if cfg.summary:
         try:
-            # Try to fetch unique categories from summary table
-            categories_query = f"SELECT DISTINCT category FROM `{PROJECT_ID}.{DATASET}.{SUMMARY}` WHERE category IS NOT NULL ORDER BY category"
-            categories_job = client.query(categories_query)
-            categories_df = categories_job.to_dataframe()
+            # Try to fetch unique categories from summary table (cached)
+            categories = load_categories(cfg.project, cfg.dataset, cfg.summary)
             summary_table_available = True
-            
-            if not categories_df.empty:
-                categories_list = ["All categories"] + categories_df['category'].tolist()
+
+            if categories:
+                categories_list = ["All categories"] + categories
                 selected_category = st.selectbox("Filter by category:", categories_list)
                 if selected_category != "All categories":
                     category_filter = selected_category
@@ -150,6 +213,7 @@ with st.sidebar:
     else:
         date_from = None
         date_to = None
+        st.caption("No range set - searches cover the last 365 days.")
 
     # Summary display option
     st.subheader("Display Options")
@@ -158,18 +222,15 @@ with st.sidebar:
     # Check if summary table exists when toggled
     summary_table_exists = False
     if show_summaries:
-        if not SUMMARY:
+        if not cfg.summary:
             st.warning("⚠️ Summary table name not configured")
             show_summaries = False
         else:
             try:
-                # Check if summary table exists
-                summary_check_query = f"SELECT COUNT(*) as count FROM `{PROJECT_ID}.{DATASET}.{SUMMARY}` LIMIT 1"
-                check_job = client.query(summary_check_query)
-                check_job.result()  # Wait for query to complete
-                summary_table_exists = True
+                # Check if summary table exists (cached)
+                summary_table_exists = check_summary_table(cfg.project, cfg.dataset, cfg.summary)
             except Exception as e:
-                st.warning(f"⚠️ Summary table does not exist: `{DATASET}.{SUMMARY}`")
+                st.warning(f"⚠️ Summary table does not exist: `{cfg.dataset}.{cfg.summary}`")
                 show_summaries = False
 
     # Export option
@@ -186,27 +247,113 @@ with st.sidebar:
         else:
             st.warning("No results to export. Run a search first.")
 
-# Main search area
-col1, col2 = st.columns([4, 1])
+# Main search area - wrapped in a form so BigQuery only runs on explicit
+# submit (Enter or the button), not on every keystroke
+with st.form("search_form"):
+    col1, col2 = st.columns([4, 1])
+
+    with col1:
+        search_query = st.text_input(
+            "Search terms:",
+            placeholder="Enter keywords to search...",
+            key="search_input",
+            help="Use spaces to search multiple keywords"
+        )
+
+    with col2:
+        st.write("")  # Spacing
+        st.write("")  # Spacing
+        search_button = st.form_submit_button("🔍 Search", type="primary", use_container_width=True)
+
+# Normalize the query to a canonical token form so "Meeting ", "meeting"
+# and "meeting meeting" share one cache entry (and one BigQuery job)
+def _norm_query(query):
+    return " ".join(sorted(set(query.lower().split()))) if query else ""
 
-with col1:
-    search_query = st.text_input(
-        "Search terms:",
-        placeholder="Enter keywords to search...",
-        key="search_input",
-        help="Use spaces to search multiple keywords"
+# Thin wrapper - normalizes the cache-key-relevant arguments before they
+# reach the cached function below
+def search_emails(query, limit, search_type, date_from, date_to, sender_filter, recipient_filter, show_summaries, summary_table, category_filter, summary_table_available, check_scan=True):
+    args = (
+        _norm_query(query), limit, search_type, date_from, date_to,
+        sender_filter.strip().lower(), recipient_filter.strip().lower(),
+        show_summaries, summary_table, category_filter, summary_table_available
     )
 
-with col2:
-    st.write("")  # Spacing
-    st.write("")  # Spacing
-    search_button = st.button("🔍 Search", type="primary", use_container_width=True)
+    # Dry-run first and refuse surprisingly expensive scans until the user
+    # confirms (returns None so the caller can show the confirmation gate).
+    # The dry run is itself a network RPC, so it fires only on a fresh
+    # submit (check_scan=True); replays triggered by other widgets reuse
+    # its verdict instead of paying a round-trip per rerun. The "Run
+    # anyway" approval is scoped to the exact parameter tuple it was given
+    # for, so the gate stays armed for every other query in the session
+    if st.session_state.get("allow_big_scan") != args:
+        if check_scan:
+            try:
+                scan_bytes = _estimated_scan_bytes(*_build_search_query(*args))
+            except Exception:
+                scan_bytes = 0  # let the real query surface any error
+            if scan_bytes > MAX_SCAN_BYTES:
+                st.session_state.pending_scan_bytes = scan_bytes
+                st.session_state.pending_scan_args = args
+                return None
+        elif st.session_state.get("pending_scan_args") == args:
+            # Flagged on submit and not confirmed yet - keep refusing
+            return None
+
+    return _search_emails_cached(*args)
+
+# Canonical SQL templates, keyed by whether the summary join is needed.
+# BigQuery's 24h result cache only hits when the SQL text is byte-identical,
+# so the text is fixed per shape and only parameter values vary.
+SQL_TEMPLATES = {
+    # The summary join runs after the inner query has filtered, sorted and
+    # truncated the emails, so large Body previews are never joined for rows
+    # that would be discarded by the LIMIT
+    True: """
+        WITH e AS (
+            SELECT
+                id,
+                SUBSTR(Body, 1, 500) AS body_preview,
+                LENGTH(Body) AS body_len,
+                Subject,
+                `From` as sender,
+                `To` as recipient,
+                Date_Sent as date,
+                filename
+            FROM `{project}.{dataset}.{table}`
+            WHERE {where}
+            ORDER BY Date_Sent DESC
+            LIMIT @limit_pre
+        )
+        SELECT e.*, s.summary, s.category
+        FROM e
+        LEFT JOIN `{project}.{dataset}.{summary_table}` s
+        ON e.id = s.id
+        {category_where}
+        ORDER BY e.date DESC
+        LIMIT @limit
+        """,
+    False: """
+        SELECT
+            id,
+            SUBSTR(Body, 1, 500) AS body_preview,
+            LENGTH(Body) AS body_len,
+            Subject,
+            `From` as sender,
+            `To` as recipient,
+            Date_Sent as date,
+            filename
+        FROM `{project}.{dataset}.{table}`
+        WHERE {where}
+        ORDER BY Date_Sent DESC
+        LIMIT @limit
+        """,
+}
+
+# Query builder, shared by the dry-run guard and the real execution
+def _build_search_query(query, limit, search_type, date_from, date_to, sender_filter, recipient_filter, show_summaries, summary_table, category_filter, summary_table_available):
+    """Build the search SQL and its query parameters"""
 
-# Search function with caching
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def search_emails(query, limit, search_type, date_from, date_to, sender_filter, recipient_filter, show_summaries, summary_table, category_filter, summary_table_available):
-    """Execute BigQuery search with filters"""
-    
     # Build WHERE clause based on search type
     query_params = []
     where_conditions = []
@@ -214,197 +361,444 @@ def search_emails(query, limit, search_type, date_from, date_to, sender_filter,
     # Determine if we need to join with summary table
     # Join if either showing summaries OR filtering by category
     needs_summary_join = (show_summaries and summary_table) or (category_filter and summary_table_available)
-    
-    # Table prefix for joins (use alias when joining)
-    table_prefix = "e." if needs_summary_join else ""
-    
+
     # Add keyword search only if query is provided
     if query:
         # Determine which fields to search
         if search_type == "Subject":
-            search_fields = [f"{table_prefix}Subject"]
+            search_fields = ["Subject"]
         elif search_type == "Body":
-            search_fields = [f"{table_prefix}Body"]
+            search_fields = ["Body"]
         # elif search_type == "Summary":  # Not available in current table
         #     search_fields = ["Summary"]
         else:  # All fields
-            search_fields = [f"{table_prefix}Subject", f"{table_prefix}Body"]  # "Summary" - not available in current table
-        
-        # Split into keywords and search in selected fields
-        keywords = query.split()
-        keyword_conditions = []
-        for i, keyword in enumerate(keywords):
-            field_conditions = " OR ".join([
-                f"LOWER({field}) LIKE LOWER(@keyword_{i})" for field in search_fields
-            ])
-            condition = f"({field_conditions})"
-            keyword_conditions.append(condition)
-            query_params.append(bigquery.ScalarQueryParameter(f"keyword_{i}", "STRING", f"%{keyword}%"))
-        
-        where_conditions.append(" AND ".join(keyword_conditions))
+            search_fields = ["Subject", "Body"]  # "Summary" - not available in current table
+
+        # Fast path: use the search index (see sql/create_search_index.sql) so
+        # BigQuery prunes blocks via the token index instead of scanning every
+        # row. The index covers both Body and Subject, so single-field
+        # searches go through it too; SEARCH() has no wildcard semantics, so
+        # fall back to LIKE only when the user typed explicit wildcards.
+        has_wildcards = any(c in query for c in "%*")
+        if not has_wildcards:
+            if len(search_fields) == 1:
+                search_target = search_fields[0]
+            else:
+                search_target = "STRUCT(Body, Subject)"
+            where_conditions.append(f"SEARCH({search_target}, @search_terms)")
+            query_params.append(bigquery.ScalarQueryParameter("search_terms", "STRING", query))
+        else:
+            # Split into keywords and search the stored lowercase columns
+            # (see sql/add_lowercase_columns.sql) with pre-lowercased
+            # parameters, avoiding a per-row LOWER() call per keyword.
+            keywords = query.split()
+            lc_fields = [f"{field}_lc" for field in search_fields]
+            keyword_conditions = []
+
+            # Pre-filter on the stored trigram arrays before the LIKE
+            # verification step (see sql/add_trigram_columns.sql): a row whose
+            # trigram set is missing any query trigram cannot match, so
+            # BigQuery discards it without running LIKE over the full string.
+            # Only applies to single-field searches; wildcarded or too-short
+            # keywords contribute no trigrams and rely on the LIKE alone.
+            if len(search_fields) == 1:
+                grams = sorted({
+                    kw[i:i + 3]
+                    for kw in (k.lower() for k in keywords)
+                    if not any(c in kw for c in "%*")
+                    for i in range(len(kw) - 2)
+                })
+                for i, gram in enumerate(grams):
+                    keyword_conditions.append(f"@gram_{i} IN UNNEST({search_fields[0]}_trigrams)")
+                    query_params.append(bigquery.ScalarQueryParameter(f"gram_{i}", "STRING", gram))
+
+            # All keywords go through a single ARRAY<STRING> parameter so the
+            # SQL text keeps one shape regardless of keyword count (better
+            # for BigQuery's plan and result caches). The combined string is
+            # built once per row; LIKE keeps '%' wildcard support and '*' is
+            # normalized to '%'
+            if len(lc_fields) == 1:
+                combined_expr = lc_fields[0]
+            else:
+                combined_expr = "CONCAT(" + ", ' ', ".join(f"IFNULL({field}, '')" for field in lc_fields) + ")"
+            keyword_conditions.append(
+                f"(SELECT LOGICAL_AND({combined_expr} LIKE CONCAT('%', kw, '%')) FROM UNNEST(@keywords) kw)"
+            )
+            query_params.append(bigquery.ArrayQueryParameter(
+                "keywords", "STRING", [k.lower().replace("*", "%") for k in keywords]
+            ))
+
+            where_conditions.append(" AND ".join(keyword_conditions))
     
-    # Sender filter
+    # Sender filter - a full address (contains '@', no wildcards) uses
+    # equality so clustering on From_lc can block-prune (see
+    # sql/partition_cluster_table.sql); otherwise substring LIKE
     if sender_filter:
-        where_conditions.append(f"LOWER({table_prefix}`From`) LIKE LOWER(@sender)")
-        query_params.append(bigquery.ScalarQueryParameter("sender", "STRING", f"%{sender_filter}%"))
-    
-    # Recipient filter
+        if "@" in sender_filter and "%" not in sender_filter and "*" not in sender_filter:
+            where_conditions.append("From_lc = @sender")
+            query_params.append(bigquery.ScalarQueryParameter("sender", "STRING", sender_filter.lower()))
+        else:
+            where_conditions.append("From_lc LIKE @sender")
+            query_params.append(bigquery.ScalarQueryParameter("sender", "STRING", f"%{sender_filter.lower()}%"))
+
+    # Recipient filter - same equality fast path as the sender filter
     if recipient_filter:
-        where_conditions.append(f"LOWER({table_prefix}`To`) LIKE LOWER(@recipient)")
-        query_params.append(bigquery.ScalarQueryParameter("recipient", "STRING", f"%{recipient_filter}%"))
+        if "@" in recipient_filter and "%" not in recipient_filter and "*" not in recipient_filter:
+            where_conditions.append("To_lc = @recipient")
+            query_params.append(bigquery.ScalarQueryParameter("recipient", "STRING", recipient_filter.lower()))
+        else:
+            where_conditions.append("To_lc LIKE @recipient")
+            query_params.append(bigquery.ScalarQueryParameter("recipient", "STRING", f"%{recipient_filter.lower()}%"))
     
-    # Date filters
+    # Date filters - default to a one-year window when no range is given, so
+    # the Date_Sent partitions (see sql/partition_cluster_table.sql) can
+    # still prune instead of scanning all history
+    if date_from is None and date_to is None:
+        date_from = (datetime.now() - timedelta(days=365)).date()
+
     if date_from:
-        where_conditions.append(f"{table_prefix}Date_Sent >= @date_from")
+        where_conditions.append("Date_Sent >= @date_from")
         query_params.append(bigquery.ScalarQueryParameter("date_from", "DATE", date_from))
     
     if date_to:
-        where_conditions.append(f"{table_prefix}Date_Sent <= @date_to")
+        where_conditions.append("Date_Sent <= @date_to")
         query_params.append(bigquery.ScalarQueryParameter("date_to", "DATE", date_to))
     
-    # Category filter (applies when joining with summary table)
+    # Category filter - applied in the outer query after the join; the inner
+    # query over-fetches to leave room for the rows it removes
     if category_filter and needs_summary_join:
-        where_conditions.append("s.category = @category")
+        category_where = "WHERE s.category = @category"
+        limit_pre = limit * 5
         query_params.append(bigquery.ScalarQueryParameter("category", "STRING", category_filter))
-    
+    else:
+        category_where = ""
+        limit_pre = limit
+
     where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-    
+
     # Build query with optional summary join
-    if needs_summary_join:
-        sql_query = f"""
-        SELECT 
-            e.id,
-            e.Body,
-            e.Subject,
-            e.`From` as sender,
-            e.`To` as recipient,
-            e.Date_Sent as date,
-            e.filename,
-            s.summary,
-            s.category
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` e
-        LEFT JOIN `{PROJECT_ID}.{DATASET}.{summary_table}` s
-        ON e.id = s.id
-        WHERE {where_clause}
-        ORDER BY e.Date_Sent DESC
-        LIMIT @limit
-        """
-    else:
-        sql_query = f"""
-        SELECT 
-            id,
-            Body,
-            Subject,
-            `From` as sender,
-            `To` as recipient,
-            Date_Sent as date,
-            filename
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE {where_clause}
-        ORDER BY Date_Sent DESC
-        LIMIT @limit
-        """
-    
+    sql_query = SQL_TEMPLATES[bool(needs_summary_join)].format(
+        project=cfg.project,
+        dataset=cfg.dataset,
+        table=cfg.table,
+        summary_table=summary_table,
+        where=where_clause,
+        category_where=category_where,
+    )
+
     query_params.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
-    
+    if needs_summary_join:
+        query_params.append(bigquery.ScalarQueryParameter("limit_pre", "INT64", limit_pre))
+
+    return sql_query, query_params
+
+# Scan-size guard: a dry run is free and reports how many bytes the real
+# query would process, so obviously mistyped searches (e.g. a one-letter
+# keyword) don't scan the whole table before the user notices
+MAX_SCAN_BYTES = 10 * 1024**3
+
+def _estimated_scan_bytes(sql_query, query_params):
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=query_params, dry_run=True, use_query_cache=False
+    )
+    return client.query(sql_query, job_config=job_config).total_bytes_processed or 0
+
+# Shrink low-cardinality string columns to category dtype - the frame lives
+# in the data cache and session state, so repeated sender/recipient/filename
+# values should be stored once, not per row
+def _shrink(df):
+    for col in ('sender', 'recipient', 'filename', 'category'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+# Search function with caching
+@st.cache_data(ttl=300, max_entries=128, show_spinner=False)  # Cache for 5 minutes
+def _search_emails_cached(query, limit, search_type, date_from, date_to, sender_filter, recipient_filter, show_summaries, summary_table, category_filter, summary_table_available):
+    """Execute BigQuery search with filters"""
+
+    sql_query, query_params = _build_search_query(
+        query, limit, search_type, date_from, date_to, sender_filter,
+        recipient_filter, show_summaries, summary_table, category_filter,
+        summary_table_available
+    )
+
     # Execute query
     job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-    
+
     try:
         query_job = client.query(sql_query, job_config=job_config)
-        df = query_job.to_dataframe()
-        return df
+        # Request large result pages up front - when the Storage API is not
+        # available the REST fallback then needs one round-trip per 10k rows
+        # instead of one per 1024-row default page
+        rows = query_job.result(page_size=min(limit, 10000))
+        # Download via the Storage API as Arrow; self_destruct frees the Arrow
+        # buffers as pandas takes ownership, halving peak memory. ArrowDtype
+        # keeps strings in Arrow buffers (C-level nunique/min/max) instead of
+        # Python object columns
+        df = rows.to_arrow(bqstorage_client=bqstorage_client).to_pandas(
+            self_destruct=True, types_mapper=pd.ArrowDtype
+        )
+        # Format the date once per search; ISO strings sort/compare fine and
+        # save per-row str() formatting on every rerun
+        if not df.empty:
+            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        # SQL NULLs arrive as pd.NA under ArrowDtype, and pd.NA raises on
+        # plain truthiness checks - normalize them once here so the render
+        # path can treat every field as a real string/int. sender/recipient
+        # stay NA so the nunique() metrics keep excluding them; the card
+        # handles those two at format time
+        for col in ('Subject', 'body_preview', 'filename', 'summary', 'category'):
+            if col in df.columns:
+                df[col] = df[col].fillna('')
+        if 'body_len' in df.columns:
+            df['body_len'] = df['body_len'].fillna(0)
+        return _shrink(df)
     except Exception as e:
         st.error(f"Query error: {str(e)}")
         return pd.DataFrame()
 
+# Lazy full-body fetch (only runs when the user clicks "View Full").
+# Bodies never change, so they can stay cached much longer than searches.
+@st.cache_data(ttl=3600)
+def fetch_body(email_id):
+    """Fetch the full body of a single email by id"""
+    sql = f"""
+    SELECT Body
+    FROM `{cfg.project}.{cfg.dataset}.{cfg.table}`
+    WHERE CAST(id AS STRING) = @id
+    LIMIT 1
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("id", "STRING", str(email_id))]
+    )
+    try:
+        rows = list(client.query(sql, job_config=job_config).result())
+        return rows[0]["Body"] if rows else ""
+    except Exception as e:
+        st.error(f"Query error: {str(e)}")
+        return ""
+
+# Summary statistics in a single agg pass, memoized on the frame's content
+# hash so re-renders (every widget interaction) don't rescan the columns
+@st.cache_data(ttl=300)
+def _summary_stats(df_hash, _df):
+    agg = _df.agg({'sender': 'nunique', 'recipient': 'nunique', 'date': ['min', 'max']})
+    return {
+        'total': len(_df),
+        'unique_senders': int(agg.loc['nunique', 'sender']),
+        'unique_recipients': int(agg.loc['nunique', 'recipient']),
+        'date_min': agg.loc['min', 'date'],
+        'date_max': agg.loc['max', 'date'],
+    }
+
+# Compile one alternation regex per query (cached): a single pass over each
+# string replaces any matching term, instead of one full re-scan per term.
+# Longer terms come first so overlapping terms prefer the longest match.
+# With pyahocorasick installed, multi-term queries also get an automaton
+# that finds every term's offsets in one linear pass.
+@st.cache_resource(ttl=300)
+def _compile_terms(query_terms):
+    terms = sorted(query_terms.split(), key=len, reverse=True)
+    if not terms:
+        return None, (), None
+    pattern = re.compile("(" + "|".join(re.escape(t) for t in terms) + ")", re.IGNORECASE)
+    lowered = tuple(t.casefold() for t in terms)
+
+    automaton = None
+    if ahocorasick is not None and len(set(lowered)) > 1:
+        automaton = ahocorasick.Automaton()
+        for t in set(lowered):
+            automaton.add_word(t, len(t))
+        automaton.make_automaton()
+
+    return pattern, lowered, automaton
+
+def _highlight_ac(text, automaton):
+    """Single linear Aho-Corasick pass; overlapping matches merge into one
+    highlight span"""
+    low = text.lower()
+    spans = []
+    for end, length in automaton.iter(low):
+        start = end - length + 1
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end + 1)
+        else:
+            spans.append([start, end + 1])
+    if not spans:
+        return text
+
+    parts = []
+    prev = 0
+    for start, end in spans:
+        parts.append(text[prev:start])
+        parts.append(f'<span class="highlight">{text[start:end]}</span>')
+        prev = end
+    parts.append(text[prev:])
+    return "".join(parts)
+
+# Template replacement string - substituted at C level, no per-match
+# Python callback
+_HIGHLIGHT_REPL = r'<span class="highlight">\1</span>'
+
 # Highlight function
-def highlight_text(text, query_terms, case_sensitive=False):
+def highlight_text(text, pattern, lowered_terms, automaton=None):
     """Highlight search terms in text"""
-    if not text or not query_terms:
+    if not text or pattern is None:
         return text
-    
-    terms = query_terms.split()
-    highlighted = text
-    
-    for term in terms:
-        pattern = re.compile(re.escape(term), re.IGNORECASE if not case_sensitive else 0)
-        highlighted = pattern.sub(lambda m: f'<span class="highlight">{m.group()}</span>', highlighted)
-    
-    return highlighted
 
-# Execute search
-if search_button or search_query is not None:
+    # Cheap C-level substring check first - if no term appears at all,
+    # skip the matching pass entirely
+    low = text.casefold()
+    if not any(t in low for t in lowered_terms):
+        return text
+
+    if automaton is not None:
+        return _highlight_ac(text, automaton)
+
+    return pattern.sub(_HIGHLIGHT_REPL, text)
+
+# Windowed variant for the full-body view: run the substitution only in a
+# context window around the first match, so highlight cost stays O(window)
+# even when the body is tens of kilobytes
+def _highlight_windowed(text, pattern, ctx=200):
+    if not text or pattern is None:
+        return text
+
+    m = pattern.search(text)
+    if not m:
+        return text
+
+    start = max(0, m.start() - ctx)
+    end = min(len(text), m.end() + ctx)
+    return text[:start] + pattern.sub(_HIGHLIGHT_REPL, text[start:end]) + text[end:]
+
+# Card template for the detail view - only the row selected in the
+# result grid is rendered as a card, so formatting and highlighting cost
+# stays constant regardless of result count
+RESULT_CARD_TEMPLATE = """
+<div class="result-card">
+    <h5>{subject}</h5>
+    <p><strong>Date:</strong> {date} • <strong>From:</strong> {sender} • <strong>To:</strong> {recipient}</p>
+    <p>{body_html}</p>
+    <p style="color: #6c757d; font-size: 0.85em;">{badge}ID: {id} • Source file: {filename}</p>
+</div>
+"""
+
+CATEGORY_BADGE_TEMPLATE = '<span style="background-color: #e8f4f8; color: #0066cc; padding: 3px 8px; border-radius: 3px; font-size: 0.85em; font-weight: 500;">{category}</span> • '
+
+# Record the submitted parameters (on form submit, or after confirming an
+# expensive scan). Reruns triggered by any other widget replay the same
+# search below, which the cache answers without a new BigQuery job.
+fresh_submit = search_button or st.session_state.pop("force_search", False)
+if fresh_submit:
+    st.session_state.last_params = (
+        search_query, limit, search_type, date_from, date_to,
+        sender_filter, recipient_filter,
+        show_summaries and summary_table_exists,
+        cfg.summary if (show_summaries and summary_table_exists) or (category_filter and summary_table_available) else None,
+        category_filter, summary_table_available,
+    )
+
+# Execute (or replay) the last submitted search
+if "last_params" in st.session_state:
+    last_params = st.session_state.last_params
+    search_query = last_params[0]
+    show_summaries_active = last_params[7]
     with st.spinner("🔍 Searching emails..."):
-        results_df = search_emails(search_query, limit, search_type, date_from, date_to, sender_filter, recipient_filter, show_summaries and summary_table_exists, SUMMARY if (show_summaries and summary_table_exists) or (category_filter and summary_table_available) else None, category_filter, summary_table_available)
-        
+        results_df = search_emails(*last_params, check_scan=fresh_submit)
+
+    if results_df is not None:
         # Store in session state for export
         st.session_state.results_df = results_df
-    
+
     # Display results
-    if not results_df.empty:
+    if results_df is None:
+        # Dry run flagged an expensive scan - make the user confirm before
+        # spending it
+        scan_gb = st.session_state.get("pending_scan_bytes", 0) / 1e9
+        st.warning(f"⚠️ This query would scan {scan_gb:.1f} GB. Run it anyway?")
+        if st.button("Run anyway"):
+            st.session_state.allow_big_scan = st.session_state.pop("pending_scan_args", None)
+            st.session_state.pop("pending_scan_bytes", None)
+            st.session_state.force_search = True
+            st.rerun()
+    elif not results_df.empty:
             st.success(f"✅ Found {len(results_df)} results")
             
             # Summary statistics
+            stats = _summary_stats(pd.util.hash_pandas_object(results_df).sum(), results_df)
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Results", len(results_df))
+                st.metric("Total Results", stats['total'])
             with col2:
-                st.metric("Unique Senders", results_df['sender'].nunique())
+                st.metric("Unique Senders", stats['unique_senders'])
             with col3:
-                st.metric("Unique Recipients", results_df['recipient'].nunique())
+                st.metric("Unique Recipients", stats['unique_recipients'])
             with col4:
-                date_range = f"{results_df['date'].min()} to {results_df['date'].max()}"
+                date_range = f"{stats['date_min']} to {stats['date_max']}"
                 st.metric("Date Range", "")
                 st.caption(date_range)
             
             st.markdown("---")
-            
-            # Display each result
-            for idx, row in results_df.iterrows():
-                with st.container():
-                    col1, col2 = st.columns([3, 1])
-                    
-                    with col1:
-                        # Highlight search terms in subject
-                        highlighted_subject = highlight_text(row['Subject'], search_query if search_query else "")
-                        st.markdown(f"##### {highlighted_subject}", unsafe_allow_html=True)
-                    with col2:
-                        st.markdown(f"**Date:** {row['date']}")
-                    
-                    st.markdown(f"**From:** {row['sender']}")
-                    st.markdown(f"**To:** {row['recipient']}")
-                    
-                    # Compact view when showing summaries
-                    if show_summaries and summary_table_exists and 'summary' in row and pd.notna(row['summary']) and row['summary']:
-                        highlighted_summary = highlight_text(str(row['summary']), search_query if search_query else "")
-                        st.markdown(f"*{highlighted_summary}*", unsafe_allow_html=True)
-                    else:
-                        # Show body preview with highlighted search terms only if not showing summaries
-                        body_preview = row['Body'][:500] if len(row['Body']) > 500 else row['Body']
-                        highlighted_body = highlight_text(body_preview, search_query if search_query else "")
-                        st.markdown(f"**Body:** {highlighted_body}{'...' if len(row['Body']) > 500 else ''}", unsafe_allow_html=True)
-                    
-                    # Caption with category badge
-                    # Add category badge if available (regardless of show_summaries checkbox)
-                    if 'category' in row and pd.notna(row['category']) and row['category']:
-                        category_html = f'<span style="background-color: #e8f4f8; color: #0066cc; padding: 3px 8px; border-radius: 3px; font-size: 0.85em; font-weight: 500;">{row["category"]}</span>'
-                        caption_text = f"{category_html} • ID: {row['id']} • Source file: {row['filename']}"
-                        st.caption(caption_text, unsafe_allow_html=True)
-                    else:
-                        st.caption(f"ID: {row['id']} • Source file: {row['filename']}")
-                    
-                    # Action button
-                    view_full = st.button("🔗 View Full", key=f"view_{idx}")
-                    
-                    # Show full body if button clicked
-                    if view_full:
-                        with st.expander("Full Email Body", expanded=True):
-                            highlighted_full_body = highlight_text(row['Body'], search_query if search_query else "")
-                            st.markdown(highlighted_full_body, unsafe_allow_html=True)
-                    
-                    st.markdown("---")
-                
+
+            # Compile the highlight pattern once for the selected row
+            highlight_pattern, lowered_terms, highlight_automaton = _compile_terms(search_query) if search_query else (None, (), None)
+
+            # Virtualized result list: st.dataframe ships one compact grid to
+            # the browser instead of a delta message per card, and the detail
+            # card below - the only place highlighting runs - renders just
+            # the selected row
+            preview_cols = ['date', 'sender', 'Subject']
+            if 'category' in results_df.columns:
+                preview_cols.append('category')
+            event = st.dataframe(
+                results_df[preview_cols],
+                use_container_width=True,
+                hide_index=True,
+                on_select="rerun",
+                selection_mode="single-row",
+            )
+
+            if event.selection.rows:
+                row = results_df.iloc[event.selection.rows[0]]
+
+                highlighted_subject = highlight_text(row['Subject'], highlight_pattern, lowered_terms, highlight_automaton)
+
+                # Compact view when showing summaries
+                summary_value = row.get('summary')
+                if show_summaries_active and pd.notna(summary_value) and summary_value:
+                    body_html = f"<em>{highlight_text(str(summary_value), highlight_pattern, lowered_terms, highlight_automaton)}</em>"
+                else:
+                    # Show body preview with highlighted search terms only if not showing summaries
+                    highlighted_body = highlight_text(row['body_preview'], highlight_pattern, lowered_terms, highlight_automaton)
+                    body_html = f"<strong>Body:</strong> {highlighted_body}{'...' if row['body_len'] > 500 else ''}"
+
+                # Add category badge if available (regardless of show_summaries checkbox)
+                category_value = row.get('category')
+                if pd.notna(category_value) and category_value:
+                    badge = CATEGORY_BADGE_TEMPLATE.format(category=category_value)
+                else:
+                    badge = ""
+
+                st.markdown(RESULT_CARD_TEMPLATE.format(
+                    subject=highlighted_subject,
+                    date=row['date'],
+                    sender='' if pd.isna(row['sender']) else row['sender'],
+                    recipient='' if pd.isna(row['recipient']) else row['recipient'],
+                    body_html=body_html,
+                    badge=badge,
+                    id=row['id'],
+                    filename=row['filename']
+                ), unsafe_allow_html=True)
+
+                # Full body, fetched lazily for the selected row only
+                with st.expander("Full Email Body"):
+                    highlighted_full_body = _highlight_windowed(fetch_body(row['id']), highlight_pattern)
+                    st.markdown(highlighted_full_body, unsafe_allow_html=True)
+            else:
+                st.caption("Select a row to see the highlighted preview and full body.")
+
     else:
         st.warning("⚠️ No results found. Try different search terms or filters.")
 else:
@@ -0,0 +1,15 @@
+-- One-time setup: store pre-lowercased copies of the searched columns so
+-- query predicates can compare already-lowercased parameters directly,
+-- instead of calling LOWER() on every scanned row.
+ALTER TABLE `{PROJECT_ID}.{DATASET}.{TABLE}`
+  ADD COLUMN IF NOT EXISTS Body_lc STRING,
+  ADD COLUMN IF NOT EXISTS Subject_lc STRING,
+  ADD COLUMN IF NOT EXISTS From_lc STRING,
+  ADD COLUMN IF NOT EXISTS To_lc STRING;
+
+UPDATE `{PROJECT_ID}.{DATASET}.{TABLE}`
+SET Body_lc = LOWER(Body),
+    Subject_lc = LOWER(Subject),
+    From_lc = LOWER(`From`),
+    To_lc = LOWER(`To`)
+WHERE TRUE;
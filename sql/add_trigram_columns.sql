@@ -0,0 +1,19 @@
+-- One-time setup: store the set of lowercase trigrams for Body and Subject.
+-- Keyword searches check trigram membership first, which prunes most rows
+-- before the (expensive) LIKE verification over the full string.
+ALTER TABLE `{PROJECT_ID}.{DATASET}.{TABLE}`
+  ADD COLUMN IF NOT EXISTS Body_trigrams ARRAY<STRING>,
+  ADD COLUMN IF NOT EXISTS Subject_trigrams ARRAY<STRING>;
+
+UPDATE `{PROJECT_ID}.{DATASET}.{TABLE}`
+SET Body_trigrams = (
+      SELECT ARRAY_AGG(DISTINCT SUBSTR(b, i, 3))
+      FROM UNNEST([LOWER(Body)]) b,
+           UNNEST(GENERATE_ARRAY(1, LENGTH(b) - 2)) i
+    ),
+    Subject_trigrams = (
+      SELECT ARRAY_AGG(DISTINCT SUBSTR(s, i, 3))
+      FROM UNNEST([LOWER(Subject)]) s,
+           UNNEST(GENERATE_ARRAY(1, LENGTH(s) - 2)) i
+    )
+WHERE TRUE;
@@ -0,0 +1,6 @@
+-- One-time setup: create a search index on the email table so keyword
+-- searches can use SEARCH() instead of full-scan LIKE predicates.
+-- Run with the project/dataset/table names from your environment.
+CREATE SEARCH INDEX IF NOT EXISTS email_search_idx
+ON `{PROJECT_ID}.{DATASET}.{TABLE}`(Body, Subject)
+OPTIONS (analyzer = 'LOG_ANALYZER');
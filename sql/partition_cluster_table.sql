@@ -0,0 +1,14 @@
+-- One-time setup: rebuild the email table partitioned by send date and
+-- clustered by the lowercase sender/recipient/subject columns. Date-range
+-- filters are then partition-pruned and equality filters on From_lc/To_lc
+-- block-pruned, instead of billing a full scan.
+CREATE TABLE `{PROJECT_ID}.{DATASET}.{TABLE}_partitioned`
+PARTITION BY DATE(Date_Sent)
+CLUSTER BY From_lc, To_lc, Subject_lc
+AS
+SELECT * FROM `{PROJECT_ID}.{DATASET}.{TABLE}`;
+
+-- After verifying the new table, swap it in:
+-- DROP TABLE `{PROJECT_ID}.{DATASET}.{TABLE}`;
+-- ALTER TABLE `{PROJECT_ID}.{DATASET}.{TABLE}_partitioned`
+--   RENAME TO `{TABLE}`;